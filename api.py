@@ -1,20 +1,45 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+from itertools import combinations
 import joblib
 import pandas as pd
 import numpy as np
 import os
+from compact_model import load_compact_model
+from solar_geometry import solar_features, hour_of_year, local_now
+from monitoring import PredictionMonitor
 
 # --- Load the pre-trained model and metadata ---
 # Make sure to run 'training.py' first to generate these files.
 if not os.path.exists('solar_model_india.joblib') or not os.path.exists('model_metadata_india.joblib'):
     raise FileNotFoundError("Model files not found. Please run 'training.py' first.")
 
-model = joblib.load('solar_model_india.joblib')
+# Prefer the compact export from 'training.py' when present; it loads much faster.
+if os.path.exists('solar_model_india_compact.joblib'):
+    model = load_compact_model('solar_model_india_compact.joblib')
+else:
+    model = joblib.load('solar_model_india.joblib')
 metadata = joblib.load('model_metadata_india.joblib')
 trained_cities = metadata['cities']
-feature_order = ['AMBIENT_TEMPERATURE', 'IRRADIATION', 'MODULE_TEMPERATURE', 'HUMIDITY', 'CLOUD_COVER', 'WIND_SPEED', 'SYSTEM_CAPACITY_W'] + [f'CITY_{c}' for c in sorted(trained_cities)]
+# Models trained before the solar geometry features do not record their columns
+feature_order = metadata.get('feature_columns', ['AMBIENT_TEMPERATURE', 'IRRADIATION', 'MODULE_TEMPERATURE', 'HUMIDITY', 'CLOUD_COVER', 'WIND_SPEED', 'SYSTEM_CAPACITY_W'] + [f'CITY_{c}' for c in sorted(trained_cities)])
+
+# --- Sensitivity analysis settings ---
+# Request fields that can be swept, in the order they are passed to build_feature_matrix.
+input_fields = ['ambient_temp', 'irradiation', 'humidity', 'cloud_cover', 'wind_speed', 'system_capacity']
+# Upper bound on rows sent to the model per /sensitivity call. The default covers a
+# 100x100 heatmap plus its one-way curves while keeping one batched predict fast.
+max_sensitivity_cells = int(os.environ.get('SENSITIVITY_MAX_CELLS', 12000))
+
+# --- Prediction monitoring ---
+# Older metadata has no reference histograms; the monitor then only tracks accuracy.
+feature_histograms = metadata.get('feature_histograms')
+monitored_features = feature_histograms['features'] if feature_histograms else ['AMBIENT_TEMPERATURE', 'IRRADIATION', 'MODULE_TEMPERATURE', 'HUMIDITY', 'CLOUD_COVER', 'WIND_SPEED', 'SYSTEM_CAPACITY_W']
+monitored_columns = [feature_order.index(name) for name in monitored_features]
+monitor = PredictionMonitor(feature_histograms, monitored_features, capacity=int(os.environ.get('MONITOR_BUFFER_SIZE', 10000)))
 
 # --- Initialize FastAPI App ---
 app = FastAPI(
@@ -47,6 +72,57 @@ class PredictionRequest(BaseModel):
     cloud_cover: int
     wind_speed: int
     system_capacity: float
+    # Time of the prediction; defaults to the current time in IST
+    timestamp: Optional[datetime] = None
+
+class ActualReading(BaseModel):
+    prediction_id: str
+    actual_power_kw: float
+
+class SensitivityFeature(BaseModel):
+    name: str
+    min: float
+    max: float
+    steps: int = 20
+
+class SensitivityRequest(BaseModel):
+    base: PredictionRequest
+    features: List[SensitivityFeature]
+    # Feature pairs for two-way heatmaps; omitted means every pair of the swept features
+    # and an empty list means one-way curves only.
+    pairs: Optional[List[List[str]]] = None
+
+# --- Feature matrix construction ---
+def build_feature_matrix(city, values, timestamp=None):
+    """
+    Builds the model input frame for one city from equal-length arrays of request
+    field values (keyed by the names in input_fields), one row per prediction.
+    Solar geometry features are looked up for the hour of the given timestamp.
+    """
+    ambient_temp = np.asarray(values['ambient_temp'], dtype=float)
+    irradiation = np.asarray(values['irradiation'], dtype=float)
+    wind_speed = np.asarray(values['wind_speed'], dtype=float)
+    rows = len(ambient_temp)
+
+    columns = {
+        'AMBIENT_TEMPERATURE': ambient_temp,
+        'IRRADIATION': irradiation,
+        # Calculate module temperature
+        'MODULE_TEMPERATURE': ambient_temp + (irradiation * 25) - (wind_speed * 0.2),
+        'HUMIDITY': np.asarray(values['humidity'], dtype=float),
+        'CLOUD_COVER': np.asarray(values['cloud_cover'], dtype=float),
+        'WIND_SPEED': wind_speed,
+        'SYSTEM_CAPACITY_W': np.asarray(values['system_capacity'], dtype=float) * 1000
+    }
+    hour_index = hour_of_year(timestamp if timestamp is not None else local_now(), instant=True)[0]
+    for name, value in solar_features(city, hour_index).items():
+        columns[name] = np.full(rows, value, dtype=float)
+
+    # One-hot encoded city features; unknown cities leave every CITY_ column at 0
+    for trained_city in trained_cities:
+        columns[f'CITY_{trained_city}'] = np.full(rows, 1.0 if trained_city == city else 0.0)
+
+    return pd.DataFrame(columns)[feature_order]
 
 # --- Prediction Endpoint ---
 @app.post("/predict")
@@ -55,37 +131,123 @@ async def predict_solar_power(request: PredictionRequest):
     Takes user inputs and returns a solar power prediction.
     """
     try:
-        # Calculate module temperature
-        module_temp = request.ambient_temp + (request.irradiation * 25) - (request.wind_speed * 0.2)
-        
         # Prepare the input data for the model
-        input_data = {
-            'AMBIENT_TEMPERATURE': [request.ambient_temp],
-            'IRRADIATION': [request.irradiation],
-            'MODULE_TEMPERATURE': [module_temp],
-            'HUMIDITY': [request.humidity],
-            'CLOUD_COVER': [request.cloud_cover],
-            'WIND_SPEED': [request.wind_speed],
-            'SYSTEM_CAPACITY_W': [request.system_capacity * 1000]
-        }
-        
-        # Add one-hot encoded city features, ensuring all cities are present
-        for city in trained_cities:
-            input_data[f'CITY_{city}'] = [0]
-        if f'CITY_{request.city}' in input_data:
-            input_data[f'CITY_{request.city}'] = [1]
-        
-        input_df = pd.DataFrame(input_data)
-        input_df = input_df[feature_order]
+        input_df = build_feature_matrix(request.city, {field: [getattr(request, field)] for field in input_fields}, request.timestamp)
 
         # Get the prediction from the model
         predicted_watts = max(0, model.predict(input_df)[0])
         final_prediction_kw = predicted_watts / 1000.0
 
+        # Record the served features for drift and accuracy monitoring
+        prediction_id = monitor.record(request.city, input_df.values[0, monitored_columns], predicted_watts)
+
         return {
             "predicted_power_kw": final_prediction_kw,
+            "prediction_id": prediction_id,
             "message": "Prediction successful"
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+# --- Sensitivity Analysis Endpoint ---
+@app.post("/sensitivity")
+async def sensitivity_analysis(request: SensitivityRequest):
+    """
+    Sweeps the requested features around a base prediction and returns one-way
+    response curves and two-way heatmaps. The whole grid is expanded into a
+    single feature matrix so the model is called exactly once.
+    """
+    features = {feature.name: feature for feature in request.features}
+    if not features:
+        raise HTTPException(status_code=400, detail="At least one feature is required.")
+    if len(features) != len(request.features):
+        raise HTTPException(status_code=400, detail="Each feature may only be listed once.")
+    for feature in request.features:
+        if feature.name not in input_fields:
+            raise HTTPException(status_code=400, detail=f"Unknown feature '{feature.name}'. Choose from: {', '.join(input_fields)}.")
+        if feature.steps < 2 or feature.min > feature.max:
+            raise HTTPException(status_code=400, detail=f"Feature '{feature.name}' needs steps >= 2 and min <= max.")
+
+    pairs = request.pairs if request.pairs is not None else [list(pair) for pair in combinations(features, 2)]
+    for pair in pairs:
+        if len(pair) != 2 or pair[0] == pair[1] or any(name not in features for name in pair):
+            raise HTTPException(status_code=400, detail=f"Invalid pair {pair}: pairs must name two different swept features.")
+
+    # Every curve and heatmap plus the base prediction shares one batch
+    cells = 1 + sum(f.steps for f in features.values()) + sum(features[x].steps * features[y].steps for x, y in pairs)
+    if cells > max_sensitivity_cells:
+        raise HTTPException(status_code=400, detail=f"Requested grid has {cells} cells, above the limit of {max_sensitivity_cells}.")
+
+    try:
+        grids = {name: np.linspace(f.min, f.max, f.steps) for name, f in features.items()}
+        base = {field: getattr(request.base, field) for field in input_fields}
+        columns = {field: np.full(cells, base[field], dtype=float) for field in input_fields}
+
+        # Lay out the base row, then each one-way curve, then each flattened heatmap
+        segments = []
+        offset = 1
+        for name, grid in grids.items():
+            columns[name][offset:offset + len(grid)] = grid
+            segments.append((offset, len(grid)))
+            offset += len(grid)
+        for x_name, y_name in pairs:
+            x_mesh, y_mesh = np.meshgrid(grids[x_name], grids[y_name])
+            size = x_mesh.size
+            columns[x_name][offset:offset + size] = x_mesh.ravel()
+            columns[y_name][offset:offset + size] = y_mesh.ravel()
+            segments.append((offset, size))
+            offset += size
+
+        input_df = build_feature_matrix(request.base.city, columns, request.base.timestamp)
+        predictions_kw = np.clip(model.predict(input_df), 0, None) / 1000.0
+
+        one_way = {}
+        for (start, size), (name, grid) in zip(segments, grids.items()):
+            one_way[name] = {
+                "values": grid.tolist(),
+                "predicted_power_kw": predictions_kw[start:start + size].tolist()
+            }
+
+        two_way = []
+        for (start, size), (x_name, y_name) in zip(segments[len(grids):], pairs):
+            heatmap = predictions_kw[start:start + size].reshape(len(grids[y_name]), len(grids[x_name]))
+            two_way.append({
+                "x_feature": x_name,
+                "y_feature": y_name,
+                "x_values": grids[x_name].tolist(),
+                "y_values": grids[y_name].tolist(),
+                "predicted_power_kw": heatmap.tolist()
+            })
+
+        return {
+            "base_prediction_kw": float(predictions_kw[0]),
+            "one_way": one_way,
+            "two_way": two_way,
+            "cells": cells,
+            "message": "Sensitivity analysis successful"
+        }
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# --- Monitoring Endpoints ---
+@app.post("/actuals")
+async def record_actual_reading(reading: ActualReading):
+    """
+    Accepts a meter reading for a served prediction and adds it to the online MAE.
+    """
+    if not monitor.record_actual(reading.prediction_id, reading.actual_power_kw * 1000):
+        raise HTTPException(status_code=400, detail=f"Prediction {reading.prediction_id} is not an id issued by /predict or already has a reading.")
+    return {"message": "Reading recorded"}
+
+@app.get("/monitoring")
+async def monitoring_summary():
+    """
+    Returns served prediction counts, online MAE and per-city PSI/KS drift scores
+    against the training data, next to the offline metrics of the model.
+    """
+    return {
+        "offline": {"r2_score": metadata.get('r2_score'), "mae_watts": metadata.get('mae_watts')},
+        **monitor.summary()
+    }
@@ -8,6 +8,9 @@ import plotly.graph_objects as go
 # --- KEY CHANGE: Import the correct function name ---
 from streamlit_geolocation import streamlit_geolocation
 import math
+import os
+from compact_model import load_compact_model
+from solar_geometry import city_locations, solar_features, hour_of_year, local_now
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -170,7 +173,10 @@ st.markdown(css, unsafe_allow_html=True)
 @st.cache_resource
 def load_model_and_metadata():
     try:
-        model = joblib.load('solar_model_india.joblib')
+        if os.path.exists('solar_model_india_compact.joblib'):
+            model = load_compact_model('solar_model_india_compact.joblib')
+        else:
+            model = joblib.load('solar_model_india.joblib')
         metadata = joblib.load('model_metadata_india.joblib')
         return model, metadata
     except FileNotFoundError:
@@ -183,41 +189,22 @@ if not model or not metadata:
     st.stop()
 
 trained_cities = metadata['cities']
-city_details = {
-    "Delhi": {"lat": 28.70, "lon": 77.10, "tilt": 28, "state": "Delhi"},
-    "Mumbai": {"lat": 19.07, "lon": 72.87, "tilt": 19, "state": "Maharashtra"},
-    "Kolkata": {"lat": 22.57, "lon": 88.36, "tilt": 22, "state": "West Bengal"},
-    "Chennai": {"lat": 13.08, "lon": 80.27, "tilt": 13, "state": "Tamil Nadu"},
-    "Bengaluru": {"lat": 12.97, "lon": 77.59, "tilt": 13, "state": "Karnataka"},
-    "Hyderabad": {"lat": 17.38, "lon": 78.48, "tilt": 17, "state": "Telangana"},
-    "Ahmedabad": {"lat": 23.02, "lon": 72.57, "tilt": 23, "state": "Gujarat"},
-    "Pune": {"lat": 18.52, "lon": 73.85, "tilt": 18, "state": "Maharashtra"},
-    "Jaipur": {"lat": 26.91, "lon": 75.78, "tilt": 27, "state": "Rajasthan"},
-    "Lucknow": {"lat": 26.84, "lon": 80.94, "tilt": 27, "state": "Uttar Pradesh"},
-    "Kanpur": {"lat": 26.44, "lon": 80.33, "tilt": 26, "state": "Uttar Pradesh"},
-    "Nagpur": {"lat": 21.14, "lon": 79.08, "tilt": 21, "state": "Maharashtra"},
-    "Indore": {"lat": 22.71, "lon": 75.85, "tilt": 23, "state": "Madhya Pradesh"},
-    "Thane": {"lat": 19.21, "lon": 72.97, "tilt": 19, "state": "Maharashtra"},
-    "Bhopal": {"lat": 23.25, "lon": 77.41, "tilt": 23, "state": "Madhya Pradesh"},
-    "Visakhapatnam": {"lat": 17.68, "lon": 83.21, "tilt": 18, "state": "Andhra Pradesh"},
-    "Patna": {"lat": 25.59, "lon": 85.13, "tilt": 26, "state": "Bihar"},
-    "Vadodara": {"lat": 22.30, "lon": 73.18, "tilt": 22, "state": "Gujarat"},
-    "Ludhiana": {"lat": 30.90, "lon": 75.85, "tilt": 31, "state": "Punjab"},
-    "Agra": {"lat": 27.17, "lon": 78.00, "tilt": 27, "state": "Uttar Pradesh"},
-    "Nashik": {"lat": 19.99, "lon": 73.78, "tilt": 20, "state": "Maharashtra"},
-    "Srinagar": {"lat": 34.08, "lon": 74.79, "tilt": 34, "state": "Jammu & Kashmir"},
-    "Amritsar": {"lat": 31.63, "lon": 74.87, "tilt": 32, "state": "Punjab"},
-    "Allahabad": {"lat": 25.43, "lon": 81.84, "tilt": 25, "state": "Uttar Pradesh"},
-    "Guwahati": {"lat": 26.14, "lon": 91.73, "tilt": 26, "state": "Assam"},
-    "Coimbatore": {"lat": 11.01, "lon": 76.95, "tilt": 11, "state": "Tamil Nadu"},
-    "Jabalpur": {"lat": 23.18, "lon": 79.98, "tilt": 23, "state": "Madhya Pradesh"},
-    "Madurai": {"lat": 9.92, "lon": 78.11, "tilt": 10, "state": "Tamil Nadu"},
-    "Raipur": {"lat": 21.25, "lon": 81.62, "tilt": 21, "state": "Chhattisgarh"},
-    "Kota": {"lat": 25.21, "lon": 75.86, "tilt": 25, "state": "Rajasthan"},
-    "Chandigarh": {"lat": 30.73, "lon": 76.77, "tilt": 31, "state": "Chandigarh"},
-    "Leh": {"lat": 34.15, "lon": 77.57, "tilt": 34, "state": "Ladakh"},
-    "Bhubaneswar": {"lat": 20.29, "lon": 85.82, "tilt": 20, "state": "Odisha"}
+# Coordinates and panel tilt come from the shared solar geometry table
+city_states = {
+    "Delhi": "Delhi", "Mumbai": "Maharashtra", "Kolkata": "West Bengal",
+    "Chennai": "Tamil Nadu", "Bengaluru": "Karnataka", "Hyderabad": "Telangana",
+    "Ahmedabad": "Gujarat", "Pune": "Maharashtra", "Jaipur": "Rajasthan",
+    "Lucknow": "Uttar Pradesh", "Kanpur": "Uttar Pradesh", "Nagpur": "Maharashtra",
+    "Indore": "Madhya Pradesh", "Thane": "Maharashtra", "Bhopal": "Madhya Pradesh",
+    "Visakhapatnam": "Andhra Pradesh", "Patna": "Bihar", "Vadodara": "Gujarat",
+    "Ludhiana": "Punjab", "Agra": "Uttar Pradesh", "Nashik": "Maharashtra",
+    "Srinagar": "Jammu & Kashmir", "Amritsar": "Punjab", "Allahabad": "Uttar Pradesh",
+    "Guwahati": "Assam", "Coimbatore": "Tamil Nadu", "Jabalpur": "Madhya Pradesh",
+    "Madurai": "Tamil Nadu", "Raipur": "Chhattisgarh", "Kota": "Rajasthan",
+    "Chandigarh": "Chandigarh", "Leh": "Ladakh", "Bhubaneswar": "Odisha"
 }
+city_details = {city: {**info, "state": city_states.get(city, "")} for city, info in city_locations.items()}
+
 
 # --- Helper: GPS → Nearest Trained City ---
 def find_nearest_city(lat, lon, city_details):
@@ -349,31 +336,38 @@ elif st.session_state.page == 'results' and 'inputs' in st.session_state:
             'SYSTEM_CAPACITY_W': [system_capacity * 1000]
         }
         
+        # Solar geometry for the current hour comes from the precomputed table
+        now = local_now()
+        current_hour = hour_of_year(now, instant=True)[0]
+        for name, value in solar_features(selected_city, current_hour).items():
+            input_data[name] = [float(value)]
+
         for city in trained_cities:
             input_data[f'CITY_{city}'] = [0]
         input_data[f'CITY_{selected_city}'] = [1]
         
         input_df = pd.DataFrame(input_data)
         
-        feature_order = ['AMBIENT_TEMPERATURE', 'IRRADIATION', 'MODULE_TEMPERATURE', 'HUMIDITY', 'CLOUD_COVER', 'WIND_SPEED', 'SYSTEM_CAPACITY_W'] + [f'CITY_{c}' for c in sorted(trained_cities)]
+        feature_order = metadata.get('feature_columns', ['AMBIENT_TEMPERATURE', 'IRRADIATION', 'MODULE_TEMPERATURE', 'HUMIDITY', 'CLOUD_COVER', 'WIND_SPEED', 'SYSTEM_CAPACITY_W'] + [f'CITY_{c}' for c in sorted(trained_cities)])
         input_df = input_df[feature_order]
 
         predicted_watts = max(0, model.predict(input_df)[0])
         final_prediction_kw = predicted_watts / 1000.0
 
-        hours = list(range(24))
-        hourly_irradiation = [max(0, irradiation * np.sin((hour - 6) * np.pi / 12)) if 6 <= hour <= 18 else 0 for hour in hours]
-        hourly_predictions_kw = []
-        for hour_irr in hourly_irradiation:
-            if hour_irr > 0:
-                temp_module_hourly = ambient_temp + (hour_irr * 25) - (wind_speed * 0.2)
-                temp_input_hourly = input_df.copy()
-                temp_input_hourly['IRRADIATION'] = hour_irr
-                temp_input_hourly['MODULE_TEMPERATURE'] = temp_module_hourly
-                predicted_watts_hourly = max(0, model.predict(temp_input_hourly)[0])
-                hourly_predictions_kw.append(predicted_watts_hourly / 1000.0)
-            else:
-                hourly_predictions_kw.append(0)
+        # Daily curve: scale the entered irradiation by today's clear-sky profile for this city
+        day_hours = (hour_of_year(now)[0] // 24) * 24 + np.arange(24)
+        day_profile = solar_features(selected_city, day_hours)
+        clear_sky = day_profile['CLEAR_SKY_IRRADIATION']
+        hourly_irradiation = irradiation * clear_sky / clear_sky.max() if clear_sky.max() > 0 else np.zeros(24)
+
+        hourly_input = pd.concat([input_df] * 24, ignore_index=True)
+        hourly_input['IRRADIATION'] = hourly_irradiation
+        hourly_input['MODULE_TEMPERATURE'] = ambient_temp + (hourly_irradiation * 25) - (wind_speed * 0.2)
+        for name, values in day_profile.items():
+            if name in hourly_input.columns:
+                hourly_input[name] = values
+        hourly_watts = np.clip(model.predict(hourly_input), 0, None)
+        hourly_predictions_kw = list(np.where(hourly_irradiation > 0, hourly_watts / 1000.0, 0))
 
         daily_energy = sum(hourly_predictions_kw)
         monthly_energy = daily_energy * 30
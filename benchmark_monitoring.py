@@ -0,0 +1,55 @@
+import os
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from monitoring import PredictionMonitor, reference_histograms
+from compact_model import load_compact_model
+
+# Measures the cost PredictionMonitor.record adds to every /predict call and,
+# when a trained model is available, compares it to one single-row prediction
+# with the model api.py actually serves.
+
+iterations = 20000
+features = ['AMBIENT_TEMPERATURE', 'IRRADIATION', 'MODULE_TEMPERATURE', 'HUMIDITY', 'CLOUD_COVER', 'WIND_SPEED', 'SYSTEM_CAPACITY_W']
+cities = ['Delhi', 'Mumbai', 'Chennai']
+
+rng = np.random.default_rng(42)
+reference_df = pd.DataFrame(rng.random((30000, len(features))) * 100, columns=features)
+for i, city in enumerate(cities):
+    reference_df[f'CITY_{city}'] = (np.arange(len(reference_df)) % len(cities) == i).astype(int)
+
+monitor = PredictionMonitor(reference_histograms(reference_df, features, cities), features)
+rows = rng.random((iterations, len(features))) * 100
+
+start = time.perf_counter()
+for i in range(iterations):
+    monitor.record(cities[i % len(cities)], rows[i], 1234.0)
+record_us = (time.perf_counter() - start) / iterations * 1e6
+print(f"PredictionMonitor.record: {record_us:.1f} µs per call over {iterations} calls")
+
+start = time.perf_counter()
+monitor.summary()
+print(f"PredictionMonitor.summary: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+if os.path.exists('solar_model_india.joblib') and os.path.exists('model_metadata_india.joblib'):
+    # Load the model the same way api.py does
+    if os.path.exists('solar_model_india_compact.joblib'):
+        model_filename = 'solar_model_india_compact.joblib'
+        model = load_compact_model(model_filename)
+    else:
+        model_filename = 'solar_model_india.joblib'
+        model = joblib.load(model_filename)
+    metadata = joblib.load('model_metadata_india.joblib')
+    columns = metadata.get('feature_columns', features + [f'CITY_{c}' for c in sorted(metadata['cities'])])
+    input_df = pd.DataFrame(np.zeros((1, len(columns))), columns=columns)
+
+    model.predict(input_df)
+    start = time.perf_counter()
+    for _ in range(100):
+        model.predict(input_df)
+    predict_us = (time.perf_counter() - start) / 100 * 1e6
+    print(f"model.predict (1 row, {model_filename}): {predict_us:.1f} µs per call")
+    print(f"Monitoring overhead: {record_us / predict_us:.2%} of a prediction")
+else:
+    print("Model files not found; run 'training.py' to compare against prediction latency.")
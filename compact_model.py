@@ -0,0 +1,127 @@
+import joblib
+import numpy as np
+
+# A compact, sklearn-free representation of a trained RandomForestRegressor.
+# Every tree is flattened into shared node arrays (int32 children, small-int features,
+# float32 thresholds and leaf values) so the artifact is small and fast to load.
+
+
+def tree_node_depths(tree):
+    """
+    Returns the depth of every node of a fitted sklearn tree, propagated level by
+    level from the root through children_left/children_right.
+    """
+    left = tree.children_left
+    right = tree.children_right
+    depths = np.zeros(tree.node_count, dtype=np.int32)
+    level = np.array([0])
+    depth = 0
+    while len(level):
+        level = level[left[level] != -1]
+        level = np.concatenate([left[level], right[level]])
+        depth += 1
+        depths[level] = depth
+    return depths
+
+
+def _truncate_tree(tree, depths, max_depth):
+    """
+    Returns the node arrays of one fitted sklearn tree, cut off at max_depth.
+    Nodes at the cut become leaves that predict their stored mean value.
+    """
+    left = tree.children_left
+    right = tree.children_right
+
+    keep = depths <= max_depth if max_depth is not None else np.ones(len(depths), dtype=bool)
+    is_leaf = (left == -1) | (depths == max_depth) if max_depth is not None else left == -1
+    is_leaf = is_leaf[keep]
+
+    # Kept nodes are renumbered in their original order; the root stays at 0
+    new_index = np.cumsum(keep) - 1
+    own = np.arange(int(keep.sum()))
+
+    # Leaves point at themselves so traversal can run a fixed number of steps
+    new_left = np.where(is_leaf, own, new_index[np.maximum(left[keep], 0)])
+    new_right = np.where(is_leaf, own, new_index[np.maximum(right[keep], 0)])
+    feature = np.where(is_leaf, 0, tree.feature[keep])
+
+    # Round thresholds down to float32 so `x <= threshold` matches sklearn for float32 inputs
+    threshold64 = tree.threshold[keep]
+    threshold = threshold64.astype(np.float32)
+    rounded_up = threshold > threshold64
+    threshold[rounded_up] = np.nextafter(threshold[rounded_up], np.float32(-np.inf))
+
+    value = tree.value[keep, 0, 0].astype(np.float32)
+    return new_left, new_right, feature, threshold, value, int(depths[keep].max())
+
+
+def export_compact_forest(forest, feature_names, max_depth=None, node_depths=None):
+    """
+    Flattens a fitted RandomForestRegressor into a dict of numpy arrays,
+    optionally truncating every tree at max_depth. node_depths (one array per
+    tree from tree_node_depths) can be passed in when exporting several depths.
+    """
+    if node_depths is None:
+        node_depths = [tree_node_depths(estimator.tree_) for estimator in forest.estimators_]
+
+    lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+    offset, depth = 0, 0
+    for estimator, depths in zip(forest.estimators_, node_depths):
+        left, right, feature, threshold, value, tree_depth = _truncate_tree(estimator.tree_, depths, max_depth)
+        lefts.append(left + offset)
+        rights.append(right + offset)
+        features.append(feature)
+        thresholds.append(threshold)
+        values.append(value)
+        roots.append(offset)
+        offset += len(left)
+        depth = max(depth, tree_depth)
+
+    return {
+        "feature_names": list(feature_names),
+        "roots": np.array(roots, dtype=np.int32),
+        "children_left": np.concatenate(lefts).astype(np.int32),
+        "children_right": np.concatenate(rights).astype(np.int32),
+        "feature": np.concatenate(features).astype(np.min_scalar_type(len(feature_names))),
+        "threshold": np.concatenate(thresholds),
+        "value": np.concatenate(values),
+        "max_depth": depth,
+    }
+
+
+class CompactForest:
+    """
+    Predicts with the arrays produced by export_compact_forest, walking all trees
+    for all rows at once, one tree level per step.
+    """
+
+    def __init__(self, arrays):
+        self.feature_names = arrays["feature_names"]
+        self.roots = arrays["roots"]
+        self.children_left = arrays["children_left"]
+        self.children_right = arrays["children_right"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.value = arrays["value"]
+        self.max_depth = arrays["max_depth"]
+
+    def predict(self, X):
+        if hasattr(X, "columns"):
+            X = X[self.feature_names]
+        X = np.asarray(X, dtype=np.float32)
+
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.children_left[nodes], self.children_right[nodes])
+
+        return self.value[nodes].mean(axis=1, dtype=np.float64)
+
+
+def save_compact_model(arrays, filename):
+    joblib.dump(arrays, filename, compress=3)
+
+
+def load_compact_model(filename):
+    return CompactForest(joblib.load(filename))
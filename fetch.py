@@ -3,24 +3,13 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import time
+from solar_geometry import city_locations, timezone_name, add_solar_features
 
 print("Starting to fetch new, more detailed solar and weather data for multiple Indian cities...")
 print("Using efficient batch CHUNKING with automatic retries to ensure reliability.")
 
 # A comprehensive list of over 30 major Indian cities with coordinates
-cities = {
-    "Delhi": (28.70, 77.10), "Mumbai": (19.07, 72.87), "Kolkata": (22.57, 88.36),
-    "Chennai": (13.08, 80.27), "Bengaluru": (12.97, 77.59), "Hyderabad": (17.38, 78.48),
-    "Ahmedabad": (23.02, 72.57), "Pune": (18.52, 73.85), "Jaipur": (26.91, 75.78),
-    "Lucknow": (26.84, 80.94), "Kanpur": (26.44, 80.33), "Nagpur": (21.14, 79.08),
-    "Indore": (22.71, 75.85), "Thane": (19.21, 72.97), "Bhopal": (23.25, 77.41),
-    "Visakhapatnam": (17.68, 83.21), "Patna": (25.59, 85.13), "Vadodara": (22.30, 73.18),
-    "Ludhiana": (30.90, 75.85), "Agra": (27.17, 78.00), "Nashik": (19.99, 73.78),
-    "Srinagar": (34.08, 74.79), "Amritsar": (31.63, 74.87), "Allahabad": (25.43, 81.84),
-    "Guwahati": (26.14, 91.73), "Coimbatore": (11.01, 76.95), "Jabalpur": (23.18, 79.98),
-    "Madurai": (9.92, 78.11), "Raipur": (21.25, 81.62), "Kota": (25.21, 75.86),
-    "Chandigarh": (30.73, 76.77), "Leh": (34.15, 77.57), "Bhubaneswar": (20.29, 85.82)
-}
+cities = {city: (info["lat"], info["lon"]) for city, info in city_locations.items()}
 
 # --- Implement the chunking strategy ---
 def get_chunks(data, chunk_size):
@@ -51,7 +40,9 @@ for i, chunk in enumerate(city_chunks):
     params = {
         "latitude": chunk_latitudes, "longitude": chunk_longitudes,
         "start_date": start_date, "end_date": end_date,
-        "hourly": "temperature_2m,shortwave_radiation,relativehumidity_2m,cloudcover,windspeed_10m"
+        "hourly": "temperature_2m,shortwave_radiation,relativehumidity_2m,cloudcover,windspeed_10m",
+        # Local time stamps line up with the solar geometry table
+        "timezone": timezone_name
     }
 
     # --- Automatic retry logic ---
@@ -111,6 +102,9 @@ weather_df['HUMIDITY'] = weather_df.groupby('CITY')['HUMIDITY'].transform(lambda
 weather_df['AMBIENT_TEMPERATURE'] = weather_df.groupby('CITY')['AMBIENT_TEMPERATURE'].transform(lambda x: x.fillna(x.mean()))
 weather_df.dropna(inplace=True)
 
+# --- Add solar geometry features from the precomputed table ---
+weather_df = add_solar_features(weather_df)
+
 print(f"\nData processing complete. Found data for {len(weather_df['CITY'].unique())} cities.")
 
 # --- Simulate for multiple household system sizes ---
@@ -0,0 +1,185 @@
+import os
+import threading
+from collections import deque
+import time
+import uuid
+import numpy as np
+
+# Drift and accuracy monitoring for served predictions. Everything is held in
+# fixed-size numpy arrays, so memory stays constant however long the API runs.
+# Live histograms cover the predictions currently in the ring buffer, so drift
+# that starts late is not diluted by older traffic. Accuracy does not use the
+# buffer: prediction ids carry the city and predicted value, so any worker can
+# score a reading however long after the prediction it arrives.
+
+histogram_bins = 10
+
+
+def reference_histograms(X, feature_names, cities, bins=histogram_bins):
+    """
+    Builds the training-time reference for drift scores from a feature frame with
+    one-hot CITY_ columns: quantile cut points per feature and per-city bin counts.
+    """
+    values = X[feature_names].to_numpy(dtype=float)
+    cuts = np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1], axis=0).T
+
+    counts = np.zeros((len(cities), len(feature_names), bins), dtype=np.int64)
+    for c, city in enumerate(cities):
+        city_values = values[X[f'CITY_{city}'].to_numpy() == 1]
+        binned = _bin_index(city_values, cuts)
+        for f in range(len(feature_names)):
+            counts[c, f] = np.bincount(binned[:, f], minlength=bins)
+
+    return {"features": list(feature_names), "cities": list(cities), "cuts": cuts, "counts": counts}
+
+
+def _bin_index(values, cuts):
+    # Bin i holds values in [cuts[i-1], cuts[i]); works on one row or a 2-D batch
+    return (values[..., None] >= cuts).sum(axis=-1)
+
+
+def psi(expected, actual, eps=1e-4):
+    e = expected / max(expected.sum(), 1)
+    a = actual / max(actual.sum(), 1)
+    e, a = np.maximum(e, eps), np.maximum(a, eps)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def ks(expected, actual):
+    # Kolmogorov-Smirnov distance between the binned cumulative distributions
+    e = np.cumsum(expected) / max(expected.sum(), 1)
+    a = np.cumsum(actual) / max(actual.sum(), 1)
+    return float(np.max(np.abs(a - e)))
+
+
+class PredictionMonitor:
+    """
+    Records the binned features of served predictions in a ring buffer, keeps
+    per-city feature histograms over that window for PSI/KS drift scores, and tracks
+    online MAE once actual meter readings are posted back for a prediction id.
+    """
+
+    def __init__(self, reference, feature_names, capacity=10000, min_samples=100):
+        self.reference = reference
+        self.feature_names = list(feature_names)
+        self.capacity = capacity
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+
+        # Cities outside the reference share the last row of the per-city arrays
+        self.cities = list(reference["cities"]) if reference else []
+        self.city_index = {city: i for i, city in enumerate(self.cities)}
+        n_rows = len(self.cities) + 1
+
+        self.worker_id = f"{os.getpid()}-{int(time.time())}"
+        self.served = 0
+        self.timestamps = np.zeros(capacity)
+        self.city_ids = np.zeros(capacity, dtype=np.int16)
+        self.bins = np.zeros((capacity, len(self.feature_names)), dtype=np.int8)
+
+        # Ids this worker has scored recently, so a reading posted twice is counted once
+        self.scored = set()
+        self.scored_order = deque()
+
+        bins = reference["counts"].shape[-1] if reference else histogram_bins
+        self.live_counts = np.zeros((n_rows, len(self.feature_names), bins), dtype=np.int64)
+        self.abs_error = np.zeros(n_rows)
+        self.error_count = np.zeros(n_rows, dtype=np.int64)
+
+    def record(self, city, features, prediction):
+        """
+        Stores one served prediction and returns its id for posting actuals later.
+        The id is "<city index>-<prediction as float32 hex>-<random nonce>".
+        """
+        features = np.asarray(features, dtype=float)
+        city_id = self.city_index.get(city, len(self.cities))
+        bins = _bin_index(features, self.reference["cuts"]) if self.reference else None
+
+        prediction_bits = int(np.float32(prediction).view(np.uint32))
+        prediction_id = f"{city_id:x}-{prediction_bits:08x}-{uuid.uuid4().hex[:16]}"
+        with self.lock:
+            slot = self.served % self.capacity
+            feature_index = np.arange(len(self.feature_names))
+            if self.served >= self.capacity and bins is not None:
+                # The evicted prediction leaves the drift window
+                self.live_counts[self.city_ids[slot], feature_index, self.bins[slot]] -= 1
+            self.served += 1
+            self.timestamps[slot] = time.time()
+            self.city_ids[slot] = city_id
+            if bins is not None:
+                self.bins[slot] = bins
+                self.live_counts[city_id, feature_index, bins] += 1
+        return prediction_id
+
+    def record_actual(self, prediction_id, actual):
+        """
+        Adds the error of a served prediction to the online MAE. Returns False when
+        the id is malformed or was already scored by this worker.
+        """
+        parts = prediction_id.split('-')
+        if len(parts) != 3 or len(parts[1]) != 8:
+            return False
+        try:
+            city_id = int(parts[0], 16)
+            prediction = float(np.uint32(int(parts[1], 16)).view(np.float32))
+        except ValueError:
+            return False
+        if not 0 <= city_id <= len(self.cities) or not np.isfinite(prediction):
+            return False
+
+        with self.lock:
+            if prediction_id in self.scored:
+                return False
+            self.scored.add(prediction_id)
+            self.scored_order.append(prediction_id)
+            if len(self.scored_order) > self.capacity:
+                self.scored.discard(self.scored_order.popleft())
+            self.abs_error[city_id] += abs(actual - prediction)
+            self.error_count[city_id] += 1
+        return True
+
+    def _drift(self, expected, actual):
+        return {
+            name: {"psi": psi(expected[f], actual[f]), "ks": ks(expected[f], actual[f])}
+            for f, name in enumerate(self.feature_names)
+        }
+
+    def summary(self):
+        with self.lock:
+            live_counts = self.live_counts.copy()
+            abs_error = self.abs_error.copy()
+            error_count = self.error_count.copy()
+            served = self.served
+            buffered = min(served, self.capacity)
+            oldest_slot = served % self.capacity if served > self.capacity else 0
+            window_start = float(self.timestamps[oldest_slot]) if buffered else None
+            window_end = float(self.timestamps[(served - 1) % self.capacity]) if buffered else None
+
+        names = self.cities + ['other']
+        total_errors = error_count.sum()
+        # Each API worker monitors its own traffic; worker_id tells reports apart
+        report = {
+            "worker_id": self.worker_id,
+            "served_predictions": served,
+            "buffered_predictions": buffered,
+            "window_start": window_start,
+            "window_end": window_end,
+            "mae_watts": float(abs_error.sum() / total_errors) if total_errors else None,
+            "actuals_received": int(total_errors),
+            "cities": {},
+            "drift": {},
+        }
+        for i, name in enumerate(names):
+            if error_count[i]:
+                report["cities"][name] = {"mae_watts": float(abs_error[i] / error_count[i]), "actuals_received": int(error_count[i])}
+
+        if self.reference:
+            # Drift is only scored once a city has enough traffic to be meaningful
+            expected = self.reference["counts"]
+            observed = live_counts[:, 0].sum(axis=1)
+            if observed.sum() >= self.min_samples:
+                report["drift"]["all"] = self._drift(expected.sum(axis=0), live_counts.sum(axis=0))
+            for i, name in enumerate(self.cities):
+                if observed[i] >= self.min_samples:
+                    report["drift"][name] = self._drift(expected[i], live_counts[i])
+        return report
@@ -0,0 +1,166 @@
+import hashlib
+import inspect
+import os
+import numpy as np
+import pandas as pd
+
+# Precomputed solar geometry for every trained city and every hour of the year.
+# The table is built once with vectorized numpy, cached on disk, and afterwards
+# fetch.py, training.py, api.py and app.py only do index lookups into it.
+
+city_locations = {
+    "Delhi": {"lat": 28.70, "lon": 77.10, "tilt": 28}, "Mumbai": {"lat": 19.07, "lon": 72.87, "tilt": 19},
+    "Kolkata": {"lat": 22.57, "lon": 88.36, "tilt": 22}, "Chennai": {"lat": 13.08, "lon": 80.27, "tilt": 13},
+    "Bengaluru": {"lat": 12.97, "lon": 77.59, "tilt": 13}, "Hyderabad": {"lat": 17.38, "lon": 78.48, "tilt": 17},
+    "Ahmedabad": {"lat": 23.02, "lon": 72.57, "tilt": 23}, "Pune": {"lat": 18.52, "lon": 73.85, "tilt": 18},
+    "Jaipur": {"lat": 26.91, "lon": 75.78, "tilt": 27}, "Lucknow": {"lat": 26.84, "lon": 80.94, "tilt": 27},
+    "Kanpur": {"lat": 26.44, "lon": 80.33, "tilt": 26}, "Nagpur": {"lat": 21.14, "lon": 79.08, "tilt": 21},
+    "Indore": {"lat": 22.71, "lon": 75.85, "tilt": 23}, "Thane": {"lat": 19.21, "lon": 72.97, "tilt": 19},
+    "Bhopal": {"lat": 23.25, "lon": 77.41, "tilt": 23}, "Visakhapatnam": {"lat": 17.68, "lon": 83.21, "tilt": 18},
+    "Patna": {"lat": 25.59, "lon": 85.13, "tilt": 26}, "Vadodara": {"lat": 22.30, "lon": 73.18, "tilt": 22},
+    "Ludhiana": {"lat": 30.90, "lon": 75.85, "tilt": 31}, "Agra": {"lat": 27.17, "lon": 78.00, "tilt": 27},
+    "Nashik": {"lat": 19.99, "lon": 73.78, "tilt": 20}, "Srinagar": {"lat": 34.08, "lon": 74.79, "tilt": 34},
+    "Amritsar": {"lat": 31.63, "lon": 74.87, "tilt": 32}, "Allahabad": {"lat": 25.43, "lon": 81.84, "tilt": 25},
+    "Guwahati": {"lat": 26.14, "lon": 91.73, "tilt": 26}, "Coimbatore": {"lat": 11.01, "lon": 76.95, "tilt": 11},
+    "Jabalpur": {"lat": 23.18, "lon": 79.98, "tilt": 23}, "Madurai": {"lat": 9.92, "lon": 78.11, "tilt": 10},
+    "Raipur": {"lat": 21.25, "lon": 81.62, "tilt": 21}, "Kota": {"lat": 25.21, "lon": 75.86, "tilt": 25},
+    "Chandigarh": {"lat": 30.73, "lon": 76.77, "tilt": 31}, "Leh": {"lat": 34.15, "lon": 77.57, "tilt": 34},
+    "Bhubaneswar": {"lat": 20.29, "lon": 85.82, "tilt": 20}
+}
+
+# All cities share Indian Standard Time; table hours are IST wall-clock hours
+timezone_name = 'Asia/Kolkata'
+utc_offset_hours = 5.5
+hours_per_year = 365 * 24
+
+solar_feature_columns = ['SOLAR_ELEVATION', 'CLEAR_SKY_IRRADIATION', 'POA_FACTOR']
+table_filename_prefix = 'solar_geometry_india'
+
+_table = None
+_city_index = None
+
+
+def compute_solar_table(locations):
+    """
+    Returns a float32 array of shape (cities, hours_per_year, 3) holding solar elevation
+    (degrees), clear-sky irradiance (kW/m², Haurwitz model) and the plane-of-array factor
+    for a south-facing panel at the city's tilt. Hour label h describes the hour ending
+    at h, matching Open-Meteo's hourly radiation, so values are taken at h - 0.5.
+    """
+    lat = np.radians([loc["lat"] for loc in locations.values()])[:, None]
+    lon = np.array([loc["lon"] for loc in locations.values()])[:, None]
+    tilt = np.radians([loc["tilt"] for loc in locations.values()])[:, None]
+
+    hour = np.arange(hours_per_year)
+    day = hour // 24
+    local_time = (hour % 24) - 0.5
+
+    # NOAA fractional-year approximations for declination and the equation of time
+    gamma = 2 * np.pi / 365 * (day + (local_time - 12) / 24)
+    eqtime = 229.18 * (0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+                       - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma))
+    decl = (0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma)
+            - 0.006758 * np.cos(2 * gamma) + 0.000907 * np.sin(2 * gamma)
+            - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma))
+
+    true_solar_minutes = local_time * 60 + eqtime + 4 * lon - 60 * utc_offset_hours
+    hour_angle = np.radians(true_solar_minutes / 4 - 180)
+
+    cos_zenith = np.sin(lat) * np.sin(decl) + np.cos(lat) * np.cos(decl) * np.cos(hour_angle)
+    sun_up = cos_zenith > 0
+    elevation = np.degrees(np.arcsin(np.clip(cos_zenith, -1, 1)))
+
+    clear_sky = np.where(sun_up, 1.098 * cos_zenith * np.exp(-0.057 / np.maximum(cos_zenith, 1e-3)), 0)
+
+    # Transposition to the tilted plane: beam scaled by cos(incidence)/cos(zenith) with a
+    # fixed clear-sky diffuse share, plus isotropic sky diffuse and ground reflection.
+    cos_incidence = np.sin(lat - tilt) * np.sin(decl) + np.cos(lat - tilt) * np.cos(decl) * np.cos(hour_angle)
+    beam_ratio = np.maximum(cos_incidence, 0) / np.maximum(cos_zenith, np.sin(np.radians(5)))
+    diffuse_share, albedo = 0.2, 0.2
+    poa_factor = ((1 - diffuse_share) * beam_ratio + diffuse_share * (1 + np.cos(tilt)) / 2
+                  + albedo * (1 - np.cos(tilt)) / 2)
+    poa_factor = np.where(sun_up, poa_factor, 0)
+
+    return np.stack([elevation, clear_sky, poa_factor], axis=-1).astype(np.float32)
+
+
+def table_filename():
+    # The cache key covers the cities and the formulas, so editing either rebuilds the table
+    inputs = repr((city_locations, solar_feature_columns, utc_offset_hours, hours_per_year)) + inspect.getsource(compute_solar_table)
+    return f"{table_filename_prefix}_{hashlib.sha256(inputs.encode()).hexdigest()[:12]}.npz"
+
+
+def load_solar_table():
+    global _table, _city_index
+    if _table is None:
+        filename = table_filename()
+        if os.path.exists(filename):
+            with np.load(filename) as cached:
+                _table = cached['table']
+                cities = list(cached['cities'])
+        else:
+            cities = list(city_locations)
+            _table = compute_solar_table(city_locations)
+            # Write to a private temp file first so concurrent workers never read a partial file
+            temp_filename = f"{filename}.{os.getpid()}.tmp"
+            with open(temp_filename, 'wb') as f:
+                np.savez_compressed(f, table=_table, cities=np.array(cities))
+            os.replace(temp_filename, filename)
+        _city_index = {city: i for i, city in enumerate(cities)}
+    return _table, _city_index
+
+
+def local_now():
+    return pd.Timestamp.now(tz=timezone_name).tz_localize(None)
+
+
+def hour_of_year(timestamps, instant=False):
+    """
+    Maps timestamps (naive IST or timezone-aware) to row indices of the table.
+    By default timestamps are hour labels, as in fetched data. With instant=True they
+    are points in time, such as "now" when serving, and map to the hour that contains
+    them, i.e. the label floor(t) + 1.
+    In leap years Feb 29 reuses Feb 28's rows and later dates shift back one day, so
+    every date from March on maps to the same row as in a common year.
+    """
+    if not isinstance(timestamps, (pd.Series, pd.Index)):
+        timestamps = np.atleast_1d(timestamps)
+    times = pd.DatetimeIndex(pd.to_datetime(timestamps))
+    if times.tz is not None:
+        times = times.tz_convert(timezone_name).tz_localize(None)
+    day = times.dayofyear.values - (times.is_leap_year & (times.dayofyear > 59))
+    day = np.clip(day, 1, 365) - 1
+    index = day * 24 + times.hour.values
+    if instant:
+        index = (index + 1) % hours_per_year
+    return index
+
+
+def solar_features(city, hour_index):
+    """
+    Looks up the solar features for one city at the given hour indices. Cities
+    outside the table get the average over all tabulated cities.
+    """
+    table, city_index = load_solar_table()
+    if city in city_index:
+        rows = table[city_index[city], hour_index]
+    else:
+        rows = table[:, hour_index].mean(axis=0)
+    return {name: rows[..., i] for i, name in enumerate(solar_feature_columns)}
+
+
+def add_solar_features(df):
+    """
+    Adds the solar feature columns to a frame with DATE_TIME and CITY columns.
+    Naive DATE_TIME values are read as IST; timezone-aware ones are converted.
+    """
+    table, city_index = load_solar_table()
+    hours = hour_of_year(df['DATE_TIME'])
+    cities = df['CITY'].map(city_index)
+    known = cities.notna().values
+    rows = np.empty((len(df), len(solar_feature_columns)), dtype=np.float32)
+    rows[known] = table[cities[known].astype(int).values, hours[known]]
+    rows[~known] = table.mean(axis=0)[hours[~known]]
+    for i, name in enumerate(solar_feature_columns):
+        df[name] = rows[:, i]
+    return df
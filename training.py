@@ -1,77 +1,416 @@
 import pandas as pd
+import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestRegressor 
+from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import r2_score, mean_absolute_error
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import argparse
+import hashlib
+import json
 import joblib
+import os
+import time
 from datetime import datetime
+from compact_model import CompactForest, export_compact_forest, tree_node_depths, save_compact_model, load_compact_model
+from solar_geometry import solar_feature_columns, add_solar_features
+from monitoring import reference_histograms
 
 # This script will now save the model files in the same folder it is run from.
+# Run `python training.py --search` to tune hyperparameters instead of training the final model.
 
-print("Starting model training process with the comprehensive, multi-size household dataset...")
-
-try:
-    df = pd.read_csv('India_Household_Solar_Data_Multi_Size.csv')
-    print(f"Successfully loaded '{df.shape[0]}' records from 'India_Household_Solar_Data_Multi_Size.csv'.")
-except FileNotFoundError:
-    print("Error: 'India_Household_Solar_Data_Multi_Size.csv' not found.")
-    print("Please ensure the CSV file is in the same folder as this script.")
-    exit()
-
-df['DATE_TIME'] = pd.to_datetime(df['DATE_TIME'])
-start_date = df['DATE_TIME'].min().strftime('%Y-%m-%d')
-end_date = df['DATE_TIME'].max().strftime('%Y-%m-%d')
-
-df = pd.get_dummies(df, columns=['CITY'], prefix='CITY', dtype=int)
-print(f"Successfully converted the CITY column into numerical features.")
+data_filename = 'India_Household_Solar_Data_Multi_Size.csv'
+feature_cache_dir = 'feature_cache'
 
 weather_features = [
-    'AMBIENT_TEMPERATURE', 'IRRADIATION', 'MODULE_TEMPERATURE', 
+    'AMBIENT_TEMPERATURE', 'IRRADIATION', 'MODULE_TEMPERATURE',
     'HUMIDITY', 'CLOUD_COVER', 'WIND_SPEED'
 ]
+solar_features = solar_feature_columns
 system_features = ['SYSTEM_CAPACITY_W']
-city_features = [col for col in df.columns if col.startswith('CITY_')]
-feature_columns = weather_features + system_features + city_features
 target_column = 'DC_POWER'
 
-X = df[feature_columns].copy()
-y = df[target_column].copy()
-X.fillna(X.mean(), inplace=True)
-y.fillna(y.mean(), inplace=True)
+# --- Hyperparameter search settings ---
+# Default grid; override it with --grid or --grid-file instead of editing the script.
+search_grid = {
+    'n_estimators': [10, 20, 40],
+    'max_depth': [None, 12, 18],
+    'min_samples_leaf': [1, 5],
+}
+search_seed = 42
+search_validation_fraction = 0.2
+search_trials_filename = 'hyperparameter_trials.csv'
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-print("Data splitting complete.")
 
-print("Training the final model using the advanced RandomForestRegressor...")
-model = RandomForestRegressor(n_estimators=20, random_state=42, n_jobs=-1, verbose=1)
-model.fit(X_train, y_train)
-print("Model training complete!")
+def load_dataset():
+    try:
+        df = pd.read_csv(data_filename)
+        print(f"Successfully loaded '{df.shape[0]}' records from '{data_filename}'.")
+    except FileNotFoundError:
+        print(f"Error: '{data_filename}' not found.")
+        print("Please ensure the CSV file is in the same folder as this script.")
+        exit()
 
-print("\n--- Model Performance Evaluation ---")
-y_pred = model.predict(X_test)
+    df['DATE_TIME'] = pd.to_datetime(df['DATE_TIME'])
+    # Datasets from older fetch.py runs lack the solar geometry columns and were
+    # fetched without a timezone, so Open-Meteo returned their timestamps in GMT
+    if not all(col in df.columns for col in solar_features):
+        df['DATE_TIME'] = df['DATE_TIME'].dt.tz_localize('UTC')
+        df = add_solar_features(df)
 
-r2 = r2_score(y_test, y_pred)
-print(f"✅ R-squared (R²) Score: {r2:.4f}")
-print(f"   (This means our model explains {r2:.2%} of the variance in the power output.)")
+    df = pd.get_dummies(df, columns=['CITY'], prefix='CITY', dtype=int)
+    print(f"Successfully converted the CITY column into numerical features.")
 
-mae = mean_absolute_error(y_test, y_pred)
-print(f"✅ Mean Absolute Error (MAE): {mae:.2f} Watts")
-print(f"   (On average, the model's prediction is off by approximately {mae:.2f} Watts.)")
-print("------------------------------------\n")
+    city_features = [col for col in df.columns if col.startswith('CITY_')]
+    feature_columns = weather_features + solar_features + system_features + city_features
 
+    X = df[feature_columns].copy()
+    y = df[target_column].copy()
+    X.fillna(X.mean(), inplace=True)
+    y.fillna(y.mean(), inplace=True)
+    return df['DATE_TIME'], X, y, feature_columns
 
-model_filename = 'solar_model_india.joblib'
-joblib.dump(model, model_filename)
-print(f"Model saved successfully as '{model_filename}'")
 
-metadata_filename = 'model_metadata_india.joblib'
-model_metadata = {
-    "last_trained": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-    "data_start_date": start_date,
-    "data_end_date": end_date,
-    "cities": [city.replace('CITY_', '') for city in city_features],
-    "r2_score": r2,
-    "mae_watts": mae
-}
-joblib.dump(model_metadata, metadata_filename)
-print(f"Model metadata saved successfully as '{metadata_filename}'")
+def train_model():
+    print("Starting model training process with the comprehensive, multi-size household dataset...")
+
+    dates, X, y, feature_columns = load_dataset()
+    start_date = dates.min().strftime('%Y-%m-%d')
+    end_date = dates.max().strftime('%Y-%m-%d')
+    city_features = [col for col in feature_columns if col.startswith('CITY_')]
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    print("Data splitting complete.")
+
+    print("Training the final model using the advanced RandomForestRegressor...")
+    model = RandomForestRegressor(n_estimators=20, random_state=42, n_jobs=-1, verbose=1)
+    model.fit(X_train, y_train)
+    print("Model training complete!")
+
+    print("\n--- Model Performance Evaluation ---")
+    y_pred = model.predict(X_test)
+
+    r2 = r2_score(y_test, y_pred)
+    print(f"✅ R-squared (R²) Score: {r2:.4f}")
+    print(f"   (This means our model explains {r2:.2%} of the variance in the power output.)")
+
+    mae = mean_absolute_error(y_test, y_pred)
+    print(f"✅ Mean Absolute Error (MAE): {mae:.2f} Watts")
+    print(f"   (On average, the model's prediction is off by approximately {mae:.2f} Watts.)")
+    print("------------------------------------\n")
+
+
+    model_filename = 'solar_model_india.joblib'
+    joblib.dump(model, model_filename)
+    print(f"Model saved successfully as '{model_filename}'")
+
+    # --- Export a compact model for serving ---
+    # Trees are truncated at the shallowest depth whose predictions stay within the
+    # tolerance of the full model on a slice of the training data, then stored as
+    # float32 node arrays without sklearn internals. The test set is only used to
+    # report the resulting accuracy delta.
+    compact_depth_candidates = [10, 14, 18, 22, None]
+    compact_tolerance = 0.01
+    compact_tuning_rows = 20000
+
+    X_tune = X_train.sample(n=min(compact_tuning_rows, len(X_train)), random_state=42)
+    full_tune_pred = model.predict(X_tune)
+    tolerance_watts = compact_tolerance * np.abs(full_tune_pred).mean()
+
+    print("Exporting compact model...")
+    # Node depths are computed once and reused for every candidate depth
+    node_depths = [tree_node_depths(estimator.tree_) for estimator in model.estimators_]
+    for depth in compact_depth_candidates:
+        compact_arrays = export_compact_forest(model, feature_columns, max_depth=depth, node_depths=node_depths)
+        deviation = mean_absolute_error(full_tune_pred, CompactForest(compact_arrays).predict(X_tune))
+        print(f"   max_depth={depth}: mean deviation from full model {deviation:.2f} Watts")
+        if deviation <= tolerance_watts:
+            break
+
+    compact_model_filename = 'solar_model_india_compact.joblib'
+    save_compact_model(compact_arrays, compact_model_filename)
+
+    load_start = time.perf_counter()
+    joblib.load(model_filename)
+    full_load_seconds = time.perf_counter() - load_start
+
+    load_start = time.perf_counter()
+    compact_model = load_compact_model(compact_model_filename)
+    compact_load_seconds = time.perf_counter() - load_start
+
+    compact_pred = compact_model.predict(X_test)
+    compact_r2 = r2_score(y_test, compact_pred)
+    compact_mae = mean_absolute_error(y_test, compact_pred)
+    print(f"✅ Compact model saved as '{compact_model_filename}' (max depth {compact_model.max_depth})")
+    print(f"   Size: {os.path.getsize(compact_model_filename) / 1e6:.1f} MB vs {os.path.getsize(model_filename) / 1e6:.1f} MB, "
+          f"load: {compact_load_seconds:.2f}s vs {full_load_seconds:.2f}s, MAE delta: {compact_mae - mae:+.2f} Watts")
+
+    # Reference distributions for drift monitoring of served predictions
+    cities = [city.replace('CITY_', '') for city in city_features]
+    feature_histograms = reference_histograms(X_train, weather_features + system_features, cities)
+
+    metadata_filename = 'model_metadata_india.joblib'
+    model_metadata = {
+        "last_trained": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "data_start_date": start_date,
+        "data_end_date": end_date,
+        "cities": cities,
+        "feature_columns": feature_columns,
+        "feature_histograms": feature_histograms,
+        "r2_score": r2,
+        "mae_watts": mae,
+        "model_size_bytes": os.path.getsize(model_filename),
+        "model_load_seconds": full_load_seconds,
+        "compact_model": {
+            "filename": compact_model_filename,
+            "max_depth": compact_model.max_depth,
+            "size_bytes": os.path.getsize(compact_model_filename),
+            "load_seconds": compact_load_seconds,
+            "r2_score": compact_r2,
+            "mae_watts": compact_mae,
+            "mae_delta_watts": compact_mae - mae
+        }
+    }
+    joblib.dump(model_metadata, metadata_filename)
+    print(f"Model metadata saved successfully as '{metadata_filename}'")
+
+
+# --- Cached feature matrix for hyperparameter search ---
+def dataset_hash(filename):
+    # The feature definitions are part of the key so changing them invalidates the cache
+    digest = hashlib.sha256(repr(weather_features + solar_features + system_features + [target_column]).encode())
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def build_feature_cache():
+    """
+    Builds the feature matrix once, sorted by time, and stores it as .npy files
+    keyed by the dataset hash. Returns the cache directory.
+    """
+    if not os.path.exists(data_filename):
+        print(f"Error: '{data_filename}' not found.")
+        exit()
+
+    cache_dir = os.path.join(feature_cache_dir, dataset_hash(data_filename))
+    if os.path.exists(os.path.join(cache_dir, 'meta.joblib')):
+        print(f"Using cached feature matrix from '{cache_dir}'.")
+        return cache_dir
+
+    print("Building feature matrix cache...")
+    dates, X, y, feature_columns = load_dataset()
+    order = np.argsort(dates.values, kind='stable')
+
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(os.path.join(cache_dir, 'X.npy'), X.values[order].astype(np.float32))
+    np.save(os.path.join(cache_dir, 'y.npy'), y.values[order].astype(np.float64))
+    np.save(os.path.join(cache_dir, 'dates.npy'), dates.values[order].astype('datetime64[ns]'))
+    # meta.joblib is written last so a half-built cache is never reused
+    joblib.dump({"feature_columns": feature_columns}, os.path.join(cache_dir, 'meta.joblib'))
+    print(f"Feature matrix cached in '{cache_dir}'.")
+    return cache_dir
+
+
+def load_feature_cache(cache_dir):
+    X = np.load(os.path.join(cache_dir, 'X.npy'), mmap_mode='r')
+    y = np.load(os.path.join(cache_dir, 'y.npy'), mmap_mode='r')
+    dates = np.load(os.path.join(cache_dir, 'dates.npy'), mmap_mode='r')
+    return X, y, dates
+
+
+def time_split_index(dates, validation_fraction):
+    # Rows are sorted by time, so validation is every row at or after the cutoff timestamp
+    cutoff = dates[int(len(dates) * (1 - validation_fraction))]
+    return int(np.searchsorted(dates, cutoff, side='left'))
+
+
+def evaluate_trial(cache_dir, split, params, train_rows, rung, trial_index):
+    """
+    Fits one candidate on the most recent train_rows rows before the split and
+    scores it on the time-based validation window. Runs inside a worker process,
+    so fit time is CPU time and the model is saved for serial latency timing.
+    """
+    X, y, _ = load_feature_cache(cache_dir)
+    X_train, y_train = X[split - train_rows:split], y[split - train_rows:split]
+    X_val, y_val = X[split:], y[split:]
+
+    model = RandomForestRegressor(random_state=search_seed, n_jobs=1, **params)
+    fit_start = time.process_time()
+    model.fit(X_train, y_train)
+    fit_seconds = time.process_time() - fit_start
+
+    y_pred = model.predict(X_val)
+
+    model_filename = os.path.join(cache_dir, f"trial_{rung}_{trial_index}.joblib")
+    joblib.dump(model, model_filename)
+
+    return {
+        **params,
+        "rung": rung,
+        "train_rows": train_rows,
+        "fit_seconds": fit_seconds,
+        "mae_watts": mean_absolute_error(y_val, y_pred),
+        "model_filename": model_filename,
+    }
+
+
+def time_trial_latency(trial, X_val):
+    """
+    Times single-row predictions, which is what the API pays per /predict call.
+    Runs in the parent after the pool finishes so trials do not compete for CPU.
+    """
+    model_filename = trial.pop("model_filename")
+    model = joblib.load(model_filename)
+    # Fitted forests can be very large, so the file is removed as soon as it is loaded
+    os.remove(model_filename)
+    model.predict(X_val[:1])
+    row_latencies = []
+    for i in range(20):
+        row_start = time.perf_counter()
+        model.predict(X_val[i:i + 1])
+        row_latencies.append(time.perf_counter() - row_start)
+
+    predict_start = time.perf_counter()
+    model.predict(X_val)
+    trial["predict_seconds"] = time.perf_counter() - predict_start
+    trial["predict_latency_ms"] = float(np.median(row_latencies)) * 1000
+
+
+search_objectives = ['mae_watts', 'predict_latency_ms', 'fit_seconds']
+
+
+def dominates(a, b):
+    return all(a[o] <= b[o] for o in search_objectives) and any(a[o] < b[o] for o in search_objectives)
+
+
+def non_dominated_sort(trials):
+    """
+    Splits trials into successive Pareto fronts over MAE, predict latency and fit time.
+    """
+    remaining = list(trials)
+    fronts = []
+    while remaining:
+        front = [t for t in remaining if not any(dominates(other, t) for other in remaining)]
+        fronts.append(sorted(front, key=lambda t: t['mae_watts']))
+        remaining = [t for t in remaining if t not in front]
+    return fronts
+
+
+def pareto_front(trials):
+    return non_dominated_sort(trials)[0] if trials else []
+
+
+def run_search(grid, workers, halving, halving_factor, min_train_rows):
+    print("Starting hyperparameter search...")
+    cache_dir = build_feature_cache()
+    X, _, dates = load_feature_cache(cache_dir)
+    split = time_split_index(dates, search_validation_fraction)
+    X_val = X[split:]
+    print(f"Time-based split: training on rows before {str(dates[split])[:10]}, validating on {len(dates) - split} later rows.")
+
+    keys = sorted(grid)
+    candidates = [dict(zip(keys, values)) for values in product(*(grid[k] for k in keys))]
+
+    # Successive halving: start all candidates on a small recent window, keep the best
+    # 1/halving_factor by Pareto rank and grow the window until it covers the full training set.
+    if halving:
+        rungs = 1
+        while min_train_rows * halving_factor ** rungs < split and len(candidates) // halving_factor ** rungs >= 1:
+            rungs += 1
+        budgets = [min(split, min_train_rows * halving_factor ** r) for r in range(rungs)]
+        budgets[-1] = split
+    else:
+        budgets = [split]
+
+    all_trials = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for rung, train_rows in enumerate(budgets):
+                print(f"\n--- Rung {rung + 1}/{len(budgets)}: {len(candidates)} candidates on {train_rows} rows ---")
+                futures = [pool.submit(evaluate_trial, cache_dir, split, params, train_rows, rung, i) for i, params in enumerate(candidates)]
+                results = [f.result() for f in futures]
+                for trial in results:
+                    time_trial_latency(trial, X_val)
+                    print(f"   {', '.join(f'{k}={trial[k]}' for k in keys)}: MAE {trial['mae_watts']:.2f} W, "
+                          f"fit {trial['fit_seconds']:.1f}s, latency {trial['predict_latency_ms']:.2f} ms")
+                all_trials.extend(results)
+
+                # Survivors are taken front by front, so fast and cheap trade-offs are kept
+                # alongside the most accurate candidates; ties in the last front go by MAE.
+                if rung < len(budgets) - 1:
+                    keep = max(1, len(results) // halving_factor)
+                    survivors = [t for front in non_dominated_sort(results) for t in front][:keep]
+                    candidates = [{k: t[k] for k in keys} for t in survivors]
+    finally:
+        # Trial models left by a failed or interrupted run are always cleaned up
+        for filename in os.listdir(cache_dir):
+            if filename.startswith('trial_'):
+                os.remove(os.path.join(cache_dir, filename))
+
+    trials_df = pd.DataFrame(all_trials)
+    trials_df.to_csv(search_trials_filename, index=False)
+    print(f"\nAll {len(all_trials)} trials logged to '{search_trials_filename}'.")
+
+    final_trials = [t for t in all_trials if t['train_rows'] == split]
+    print("\n--- Pareto-optimal candidates (MAE, predict latency, fit time) ---")
+    for trial in pareto_front(final_trials):
+        print(f"✅ {', '.join(f'{k}={trial[k]}' for k in keys)}: MAE {trial['mae_watts']:.2f} W, "
+              f"latency {trial['predict_latency_ms']:.2f} ms, fit {trial['fit_seconds']:.1f}s")
+
+
+def load_search_grid(grid_json, grid_file):
+    """
+    Returns the search grid from --grid or --grid-file, or the default search_grid.
+    Keys must be RandomForestRegressor parameters and values non-empty lists.
+    """
+    if grid_json is None and grid_file is None:
+        return search_grid
+    if grid_file is not None:
+        with open(grid_file) as f:
+            grid = json.load(f)
+    else:
+        grid = json.loads(grid_json)
+
+    if not isinstance(grid, dict) or not grid:
+        raise ValueError("the grid must be a non-empty JSON object")
+    # The search sets these itself to keep trials reproducible and single-threaded
+    reserved = {'random_state', 'n_jobs', 'verbose'}
+    valid = set(RandomForestRegressor().get_params()) - reserved
+    for name, values in grid.items():
+        if name not in valid:
+            raise ValueError(f"'{name}' is not a tunable RandomForestRegressor parameter. Choose from: {', '.join(sorted(valid))}")
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"'{name}' must map to a non-empty list of values")
+    return grid
+
+
+def halving_factor_arg(value):
+    factor = int(value)
+    if factor < 2:
+        raise argparse.ArgumentTypeError("must be at least 2")
+    return factor
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train the solar power model or search its hyperparameters.")
+    parser.add_argument('--search', action='store_true', help="Run a hyperparameter search instead of training the final model.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes for the search.")
+    parser.add_argument('--halving', action='store_true', help="Use successive halving instead of a full grid search.")
+    parser.add_argument('--halving-factor', type=halving_factor_arg, default=3, help="Keep 1/N of the candidates after each halving rung.")
+    parser.add_argument('--min-train-rows', type=int, default=50000, help="Training rows used in the first halving rung.")
+    grid_group = parser.add_mutually_exclusive_group()
+    grid_group.add_argument('--grid', help='Search grid as JSON, e.g. \'{"n_estimators": [10, 20], "max_depth": [null, 12]}\'.')
+    grid_group.add_argument('--grid-file', help="Path to a JSON file holding the search grid.")
+    args = parser.parse_args()
+
+    try:
+        grid = load_search_grid(args.grid, args.grid_file)
+    except (ValueError, OSError) as e:
+        parser.error(f"invalid search grid: {e}")
 
+    if args.search:
+        run_search(grid, args.workers, args.halving, args.halving_factor, args.min_train_rows)
+    else:
+        train_model()